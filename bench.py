@@ -0,0 +1,200 @@
+"""Host-side microbenchmarks for the controller hot paths.
+
+Measures ops/sec and bytes allocated per call (tracemalloc) for:
+  - neopixel_colors.Color.to_grb
+  - LEDController.set_color / toggle
+  - the button poll callback with an unchanged button state
+  - a full simulated short-press cycle
+
+Usage:
+  python bench.py                          # run and print results
+  python bench.py --save bench_baseline.json
+  python bench.py --compare bench_baseline.json [--tolerance 0.4]
+
+--compare exits with status 1 if any benchmark got slower or allocates more
+than the baseline allows, so it can gate a commit before firmware ships.
+Baselines are machine specific and not kept in the repo: save one on the
+machine doing the comparison, before the change being checked.
+
+B/call only sees memory taken from the allocator. Objects CPython reuses
+from its free lists (small tuples, floats, bound methods) count as 0, even
+though MicroPython allocates each of them on its heap; to_grb returning a
+new tuple is the main example here.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from hal import SimBackend
+from neopixel_colors import GREEN_LOW
+from water_filter import WaterFilter, LEDController, LED_PIN
+
+# Benchmark Configuration
+MIN_RUN_TIME_S = 0.05     # Keep timing each batch for at least this long
+REPEATS = 15              # Batches per benchmark; the median one is reported
+ALLOC_SAMPLES = 50        # Calls averaged for bytes allocated per call
+DEFAULT_TOLERANCE = 0.4   # Allowed slowdown (fraction); host runs vary by about 30%
+ALLOC_SLACK_BYTES = 16    # Allowed growth in bytes per call before failing
+
+
+def bench_color_to_grb():
+    color = GREEN_LOW
+    return color.to_grb
+
+def bench_led_set_color():
+    led = LEDController(SimBackend(), LED_PIN)
+    color = led.GREEN_LOW
+    return lambda: led.set_color(color)
+
+def bench_led_toggle():
+    led = LEDController(SimBackend(), LED_PIN)
+    return led.toggle
+
+def bench_poll_unchanged():
+    wf = WaterFilter(SimBackend())
+    poll = wf.button_poll_timer.callback
+    timer = wf.button_poll_timer
+    return lambda: poll(timer)
+
+def bench_short_press_cycle():
+    hal = SimBackend()
+    wf = WaterFilter(hal)
+    wf.total_blink_time_ms = 1000
+    button = wf.button
+
+    def cycle():
+        button.value(1)
+        hal.advance(200)
+        button.value(0)
+        hal.advance(200)
+        hal.advance(wf.total_blink_time_ms + 1500)
+    return cycle
+
+BENCHMARKS = [
+    ('color_to_grb', bench_color_to_grb),
+    ('led_set_color', bench_led_set_color),
+    ('led_toggle', bench_led_toggle),
+    ('poll_button_unchanged', bench_poll_unchanged),
+    ('short_press_cycle', bench_short_press_cycle),
+]
+
+
+def measure_ops(fn):
+    """Return calls per second for the median of REPEATS timed batches"""
+    # Grow the batch until one run takes long enough to time reliably
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_RUN_TIME_S:
+            break
+        batch *= 2
+
+    times = [elapsed]
+    for _ in range(REPEATS - 1):
+        start = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return batch / times[len(times) // 2]
+
+def measure_alloc(fn):
+    """Return the average peak bytes allocated by a single call.
+
+    Free list reuse is invisible here, see the module docstring.
+    """
+    fn()  # Warm up caches and lazily created objects
+    total = 0
+    tracemalloc.start()
+    try:
+        for _ in range(ALLOC_SAMPLES):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn()
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return total // ALLOC_SAMPLES
+
+def run(names=None):
+    """Run the benchmarks (all, or those in names) and return a results dict"""
+    results = {}
+    # The controller prints debug output; discard it rather than buffer it
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for name, setup in BENCHMARKS:
+            if names and name not in names:
+                continue
+            fn = setup()
+            results[name] = {
+                'ops_per_sec': round(measure_ops(fn), 1),
+                'bytes_per_call': measure_alloc(fn),
+            }
+    return {
+        'python': platform.python_implementation() + ' ' + platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compare results against a baseline; return a list of regression messages"""
+    regressions = []
+    for name, base in baseline['results'].items():
+        now = current['results'].get(name)
+        if now is None:
+            continue
+        floor = base['ops_per_sec'] * (1 - tolerance)
+        if now['ops_per_sec'] < floor:
+            regressions.append(f"{name}: {now['ops_per_sec']:.0f} ops/s < {base['ops_per_sec']:.0f} ops/s baseline")
+        if now['bytes_per_call'] > base['bytes_per_call'] + ALLOC_SLACK_BYTES:
+            regressions.append(f"{name}: {now['bytes_per_call']} B/call > {base['bytes_per_call']} B/call baseline")
+    return regressions
+
+def print_results(current, baseline=None):
+    print(f"{'benchmark':<24}{'ops/sec':>14}{'B/call':>10}{'vs base':>10}")
+    for name, res in current['results'].items():
+        change = ''
+        if baseline and name in baseline['results']:
+            base = baseline['results'][name]['ops_per_sec']
+            change = f"{(res['ops_per_sec'] / base - 1) * 100:+.1f}%"
+        print(f"{name:<24}{res['ops_per_sec']:>14.0f}{res['bytes_per_call']:>10}{change:>10}")
+    print("B/call excludes objects reused from CPython free lists (e.g. small tuples)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Water filter hot path benchmarks")
+    parser.add_argument('--save', metavar='FILE', help="write results as a JSON baseline")
+    parser.add_argument('--compare', metavar='FILE', help="compare against a JSON baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown as a fraction (default 0.4)")
+    parser.add_argument('names', nargs='*', help="benchmarks to run (default all)")
+    args = parser.parse_args(argv)
+
+    current = run(args.names)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(current, baseline)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved baseline to {args.save}")
+
+    if baseline:
+        regressions = compare(current, baseline, args.tolerance)
+        for msg in regressions:
+            print("REGRESSION " + msg)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
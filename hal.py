@@ -0,0 +1,211 @@
+import time
+
+# Hardware abstraction layer
+#
+# WaterFilter talks to pins, timers, the NeoPixel and the clock only through
+# one of these backends, so the same logic runs on the Pico and on the host:
+#
+#   HardwareBackend  - real machine/neopixel modules (MicroPython only)
+#   SimBackend       - fast host simulation with a virtual clock
+#   RecordingBackend - SimBackend that also logs every output and timer change
+#
+# Every backend provides the same surface:
+#   pin(num, mode=None, pull=None), timer(), neopixel(pin, count)
+#   ticks_ms(), ticks_us(), ticks_diff(end, start), sleep_ms(ms)
+#   IN, OUT, PULL_DOWN, PERIODIC, ONE_SHOT
+
+
+class HardwareBackend:
+    """Backend for the real device, using machine and neopixel"""
+    def __init__(self):
+        # Imported here so that importing hal never requires MicroPython
+        from machine import Pin, Timer
+        from neopixel import NeoPixel
+        self._Pin = Pin
+        self._Timer = Timer
+        self._NeoPixel = NeoPixel
+        self.IN = Pin.IN
+        self.OUT = Pin.OUT
+        self.PULL_DOWN = Pin.PULL_DOWN
+        self.PERIODIC = Timer.PERIODIC
+        self.ONE_SHOT = Timer.ONE_SHOT
+        # The clock is read on every accounted wakeup and rendered frame:
+        # use the C functions directly rather than through a method call
+        self.ticks_ms = time.ticks_ms
+        self.ticks_us = time.ticks_us
+        self.ticks_diff = time.ticks_diff
+        self.sleep_ms = time.sleep_ms
+
+    def pin(self, num, mode=None, pull=None):
+        if mode is None:
+            return self._Pin(num)
+        if pull is None:
+            return self._Pin(num, mode)
+        return self._Pin(num, mode, pull)
+
+    def timer(self):
+        return self._Timer()
+
+    def neopixel(self, pin, count):
+        return self._NeoPixel(pin, count)
+
+
+class SimPin:
+    """Simulated GPIO pin"""
+    IN = 'IN'
+    OUT = 'OUT'
+    PULL_DOWN = 'PULL_DOWN'
+
+    def __init__(self, backend, pin_num, mode=None, pull=None):
+        self.backend = backend
+        self.pin_num = pin_num
+        self.mode = mode
+        self.pull = pull
+        self._value = 0
+
+    def value(self, val=None):
+        if val is not None:
+            self._value = val
+            self.backend.record('pin', self.pin_num, val)
+        return self._value
+
+
+class SimTimer:
+    """Simulated machine.Timer driven by the backend's virtual clock"""
+    PERIODIC = 'PERIODIC'
+    ONE_SHOT = 'ONE_SHOT'
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.callback = None
+        self.period = None
+        self.mode = None
+        self.deadline_us = 0
+
+    def init(self, period=None, mode=PERIODIC, callback=None):
+        self.period = period
+        self.mode = mode
+        self.callback = callback
+        self.deadline_us = self.backend.now_us + period * 1000
+        if self not in self.backend.timers:
+            self.backend.timers.append(self)
+        self.backend.record('timer', id(self), period)
+
+    def deinit(self):
+        self.callback = None
+        if self in self.backend.timers:
+            self.backend.timers.remove(self)
+            self.backend.record('timer', id(self), None)
+
+    def trigger(self):
+        """Fire the callback immediately, regardless of the clock"""
+        if self.callback:
+            self.callback(self)
+
+
+class SimNeoPixel:
+    """Simulated NeoPixel strip; pixels hold the last written GRB values"""
+    def __init__(self, backend, pin, count):
+        self.backend = backend
+        self.pin = pin
+        self.count = count
+        self.buf = [(0, 0, 0)] * count
+        self.pixels = list(self.buf)
+        self.writes = 0
+
+    def __getitem__(self, index):
+        return self.buf[index]
+
+    def __setitem__(self, index, value):
+        self.buf[index] = value
+
+    def write(self):
+        self.pixels = list(self.buf)
+        self.writes += 1
+        self.backend.record('led', self.pin.pin_num, self.pixels[0])
+
+
+class SimBackend:
+    """Host simulation backend with a virtual clock.
+
+    Nothing happens in real time: advance(ms) moves the clock forward and
+    fires any timers that fall due, in deadline order. sleep_ms() only moves
+    the clock, as timer callbacks cannot interrupt each other on the device.
+    """
+    IN = SimPin.IN
+    OUT = SimPin.OUT
+    PULL_DOWN = SimPin.PULL_DOWN
+    PERIODIC = SimTimer.PERIODIC
+    ONE_SHOT = SimTimer.ONE_SHOT
+
+    def __init__(self):
+        self.now_us = 0
+        self.timers = []
+        self.pins = {}
+
+    def pin(self, num, mode=None, pull=None):
+        pin = SimPin(self, num, mode, pull)
+        self.pins[num] = pin
+        return pin
+
+    def timer(self):
+        return SimTimer(self)
+
+    def neopixel(self, pin, count):
+        return SimNeoPixel(self, pin, count)
+
+    def ticks_ms(self):
+        return self.now_us // 1000
+
+    def ticks_us(self):
+        return self.now_us
+
+    def ticks_diff(self, end, start):
+        return end - start
+
+    def sleep_ms(self, ms):
+        self.record('sleep', None, ms)
+        self.now_us += ms * 1000
+
+    def advance(self, ms):
+        """Move the clock forward ms, firing timers as they fall due"""
+        end_us = self.now_us + ms * 1000
+        while True:
+            due = None
+            for timer in self.timers:
+                if timer.deadline_us <= end_us and (due is None or timer.deadline_us < due.deadline_us):
+                    due = timer
+            if due is None:
+                break
+            if due.deadline_us > self.now_us:
+                self.now_us = due.deadline_us
+            if due.mode == self.PERIODIC:
+                due.deadline_us += due.period * 1000
+            else:
+                self.timers.remove(due)
+            due.trigger()
+        if end_us > self.now_us:
+            self.now_us = end_us
+
+    def record(self, kind, ident, value):
+        """Hook for RecordingBackend; the plain simulation records nothing"""
+        pass
+
+
+class RecordingBackend(SimBackend):
+    """SimBackend that logs every output change as (ms, kind, ident, value).
+
+    kind is 'pin' (ident is the pin number), 'led' (ident is the data pin,
+    value the GRB tuple written), 'timer' (value is the period, or None when
+    the timer is stopped) or 'sleep' (value is the sleep length).
+    """
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def record(self, kind, ident, value):
+        self.events.append((self.now_us // 1000, kind, ident, value))
+
+    def filter(self, kind, ident=None):
+        """Return recorded events of one kind, optionally for one ident"""
+        return [e for e in self.events if e[1] == kind and (ident is None or e[2] == ident)]
@@ -0,0 +1,152 @@
+import time
+from neopixel_colors import EASE_CURVE, BREATHE_CURVE, to_grb
+
+# Rendering Configuration
+FRAME_RATE_HZ = 50          # Target frames per second (50-100 fps)
+FRAME_BUDGET_DIVISOR = 4    # A frame may use at most 1/4 of its period
+
+
+class LEDRenderer:
+    """Timer-driven fades, breathing and crossfades for a single NeoPixel.
+
+    Easing curves are precomputed (gamma included) in neopixel_colors, so
+    starting an effect only stores its endpoint colors, and a frame costs a
+    curve lookup by scaled elapsed time, an integer blend and, when the
+    color actually changed, one write(). Because the frame is picked from
+    the elapsed time, a late tick simply skips ahead (the frame is dropped)
+    instead of stretching the effect or holding up button polling.
+
+    clock is anything providing ticks_ms/ticks_us/ticks_diff, normally the
+    time module or a hal backend.
+    """
+
+    def __init__(self, np, timer, fps=FRAME_RATE_HZ, clock=time):
+        self.np = np
+        self.timer = timer
+        self.clock = clock
+        self.frame_ms = max(1, 1000 // fps)
+        self.frame_budget_us = self.frame_ms * 1000 // FRAME_BUDGET_DIVISOR
+
+        # Current effect: curve plus start color and per-channel span
+        self.curve = EASE_CURVE
+        self.g0 = self.r0 = self.b0 = 0
+        self.dg = self.dr = self.db = 0
+        self.duration_ms = 0
+        self.loop = False
+        self.on_done = None
+        self.start_time = 0
+        self.last_frame = 0
+        self.running = False
+
+        # Last GRB value written, for dirty checking
+        self.last_g = -1
+        self.last_r = -1
+        self.last_b = -1
+
+        # Frame statistics
+        self.frames_rendered = 0
+        self.frames_dropped = 0
+        self.max_frame_us = 0
+        self.skip_next = False
+
+    def fade(self, start, end, duration_ms, on_done=None):
+        """Fade or crossfade from start to end over duration_ms"""
+        self._play(EASE_CURVE, start, end, duration_ms, False, on_done)
+
+    def breathe(self, color, period_ms, low=(0, 0, 0)):
+        """Breathe between low and color, repeating every period_ms"""
+        self._play(BREATHE_CURVE, low, color, period_ms, True, None)
+
+    def _play(self, curve, start, end, duration_ms, loop, on_done):
+        """Start rendering start blending into end along curve"""
+        self.timer.deinit()
+        g0, r0, b0 = to_grb(start)
+        g1, r1, b1 = to_grb(end)
+        self.curve = curve
+        self.g0 = g0
+        self.r0 = r0
+        self.b0 = b0
+        self.dg = g1 - g0
+        self.dr = r1 - r0
+        self.db = b1 - b0
+        self.duration_ms = max(1, duration_ms)
+        self.loop = loop
+        self.on_done = on_done
+        self.start_time = self.clock.ticks_ms()
+        self.last_frame = 0
+        self.skip_next = False
+        self.running = True
+        self._render(0)
+        self.timer.init(period=self.frame_ms, mode=self.timer.PERIODIC, callback=self._tick)
+
+    def stop(self):
+        """Stop the current effect, leaving the LED at its last frame"""
+        if self.running:
+            self.timer.deinit()
+            self.running = False
+            self.on_done = None
+
+    def invalidate(self):
+        """Forget the last written color (call after writing the LED elsewhere)"""
+        self.last_g = -1
+
+    def _tick(self, timer):
+        if not self.running:
+            return
+        # The previous frame overran its budget: give this slot back to
+        # the button poll and let the elapsed-time index catch up next tick
+        if self.skip_next:
+            self.skip_next = False
+            return
+
+        tick_start = self.clock.ticks_us()
+        elapsed = self.clock.ticks_diff(self.clock.ticks_ms(), self.start_time)
+        steps = len(self.curve)
+        done = not self.loop and elapsed >= self.duration_ms
+        if self.loop:
+            index = (elapsed % self.duration_ms) * steps // self.duration_ms
+        elif done:
+            index = steps - 1
+        else:
+            index = elapsed * steps // self.duration_ms
+
+        # Frame slots that passed without a tick were dropped
+        frame = elapsed // self.frame_ms
+        if frame > self.last_frame + 1:
+            self.frames_dropped += frame - self.last_frame - 1
+        self.last_frame = frame
+        self._render(index)
+
+        if done:
+            on_done = self.on_done
+            self.stop()
+            if on_done:
+                on_done()
+
+        frame_us = self.clock.ticks_diff(self.clock.ticks_us(), tick_start)
+        if frame_us > self.max_frame_us:
+            self.max_frame_us = frame_us
+        if frame_us > self.frame_budget_us:
+            self.skip_next = True
+
+    def _render(self, index):
+        """Show curve position index, writing the LED only if the color changed"""
+        w = self.curve[index]
+        g = self.g0 + self.dg * w // 255
+        r = self.r0 + self.dr * w // 255
+        b = self.b0 + self.db * w // 255
+        if g != self.last_g or r != self.last_r or b != self.last_b:
+            self.np[0] = (g, r, b)
+            self.np.write()
+            self.last_g = g
+            self.last_r = r
+            self.last_b = b
+        self.frames_rendered += 1
+
+    def stats(self):
+        """Return a dict with frame statistics"""
+        return {
+            'frames_rendered': self.frames_rendered,
+            'frames_dropped': self.frames_dropped,
+            'max_frame_us': self.max_frame_us,
+        }
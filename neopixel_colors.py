@@ -1,3 +1,5 @@
+import math
+
 class Color:
     """RGB Color representation with brightness control"""
     def __init__(self, red, green, blue, brightness=1.0):
@@ -35,4 +37,54 @@ ORANGE = Color(255, 165, 0)
 RED_LOW = Color(255, 0, 0, 0.25)
 GREEN_LOW = Color(0, 255, 0, 0.25)
 BLUE_LOW = Color(0, 0, 255, 0.25)
-ORANGE_LOW = Color(255, 165, 0, 0.25) 
\ No newline at end of file
+ORANGE_LOW = Color(255, 165, 0, 0.25) 
+# Easing and gamma tables
+#
+# Everything below is computed once, at import, into bytearrays so the LED
+# renderer never does floating point work inside a timer callback.
+
+GAMMA = 2.2
+CURVE_STEPS = 64  # Entries in each precomputed easing curve
+
+def gamma_table(gamma=GAMMA):
+    """Build a 256 entry table mapping linear level to perceived level"""
+    table = bytearray(256)
+    for i in range(256):
+        table[i] = int(round(255 * ((i / 255) ** gamma)))
+    return table
+
+def ease_in_out_table(steps):
+    """Build a cosine ease-in-out curve (0..255) with the given number of steps"""
+    table = bytearray(steps)
+    last = max(1, steps - 1)
+    for i in range(steps):
+        table[i] = int(round(255 * (1 - math.cos(math.pi * i / last)) / 2))
+    return table
+
+def breathe_table(steps):
+    """Build one breathing period (0..255..0) with the given number of steps"""
+    table = bytearray(steps)
+    for i in range(steps):
+        table[i] = int(round(255 * (1 - math.cos(2 * math.pi * i / steps)) / 2))
+    return table
+
+def gamma_curve(curve, gamma=None):
+    """Pass a curve through the gamma table so fades look even to the eye"""
+    if gamma is None:
+        gamma = GAMMA_TABLE
+    table = bytearray(len(curve))
+    for i in range(len(curve)):
+        table[i] = gamma[curve[i]]
+    return table
+
+def to_grb(color):
+    """Return a GRB tuple for either a Color or an existing GRB tuple"""
+    if isinstance(color, Color):
+        return color.to_grb()
+    return color
+
+# Shared tables: gamma (256 bytes) and gamma corrected curves
+# (CURVE_STEPS bytes each), indexed by the renderer with scaled elapsed time
+GAMMA_TABLE = gamma_table()
+EASE_CURVE = gamma_curve(ease_in_out_table(CURVE_STEPS))
+BREATHE_CURVE = gamma_curve(breathe_table(CURVE_STEPS))
@@ -0,0 +1,102 @@
+"""Host-side client for the serial command channel (see serial_control.py).
+
+Usage:
+  python serial_client.py /dev/ttyACM0 get
+  python serial_client.py /dev/ttyACM0 set 2 90000
+  python serial_client.py --sim stats      # talk to a simulated controller
+
+--sim runs WaterFilter on SimBackend behind a pty, standing in for the
+Pico's USB-CDC port, so the channel can be exercised without hardware.
+"""
+import os
+import select
+import sys
+import time
+import tty
+
+# Client Configuration
+REPLY_TIMEOUT_S = 2.0   # Give up waiting for OK/ERR after this long
+SIM_TICK_MS = 100       # Simulated time advanced per pump (one button poll)
+
+
+class SerialClient:
+    """Send command lines and wait for their OK/ERR reply.
+
+    Anything else on the port (debug prints) is skipped. pump, if given, is
+    called while waiting so a simulated controller can make progress.
+    """
+
+    def __init__(self, fd, pump=None):
+        self.fd = fd
+        self.pump = pump
+        self.pending = b''
+
+    def command(self, line, timeout=REPLY_TIMEOUT_S):
+        """Send line and return the reply (without the trailing newline)"""
+        os.write(self.fd, line.encode() + b'\n')
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.pump:
+                self.pump()
+            reply = self._read_line(0 if self.pump else 0.05)
+            if reply is not None and (reply.startswith('OK') or reply.startswith('ERR')):
+                return reply
+        raise TimeoutError("no reply to: " + line)
+
+    def _read_line(self, wait_s):
+        """Return the next complete line, or None if none is ready"""
+        while b'\n' not in self.pending:
+            ready, _, _ = select.select([self.fd], [], [], wait_s)
+            if not ready:
+                return None
+            self.pending += os.read(self.fd, 256)
+        line, self.pending = self.pending.split(b'\n', 1)
+        return line.decode(errors='replace').rstrip('\r')
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_port(path):
+    """Open a real serial port (e.g. the Pico's /dev/ttyACM0) in raw mode"""
+    fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+    tty.setraw(fd)
+    return SerialClient(fd)
+
+
+def open_sim(hal=None):
+    """Start a simulated controller behind a pty and return (client, filter)"""
+    from hal import SimBackend
+    from serial_control import SerialControl
+    from water_filter import WaterFilter
+
+    if hal is None:
+        hal = SimBackend()
+    master, slave = os.openpty()
+    tty.setraw(slave)  # No echo or newline translation, like USB-CDC
+    wf = WaterFilter(hal)
+    stream = open(slave, 'rb', buffering=0)
+    out = open(os.dup(slave), 'w', buffering=1)
+    wf.control = SerialControl(wf, stream, out)
+    client = SerialClient(master, pump=lambda: hal.advance(SIM_TICK_MS))
+    return client, wf
+
+
+def main(argv):
+    if len(argv) < 2:
+        print(__doc__)
+        return 2
+    if argv[0] == '--sim':
+        client, _ = open_sim()
+    else:
+        client = open_port(argv[0])
+    try:
+        reply = client.command(' '.join(argv[1:]))
+    finally:
+        client.close()
+    print(reply)
+    return 0 if reply.startswith('OK') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
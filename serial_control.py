@@ -0,0 +1,160 @@
+import sys
+from water_filter import save_to_file, PRESET_COUNT
+
+try:
+    import uselect as select
+except ImportError:
+    import select
+
+# Serial Control Configuration
+LINE_MAX = 64               # Longest accepted command line (bytes)
+MAX_BYTES_PER_SERVICE = 32  # Bytes read per poll tick, so commands never starve the button
+
+HELP = "get | get preset N | set N MS | save | start [N] | stop | stats [reset] | help"
+
+
+class SerialControl:
+    """Line based command channel on USB-CDC stdin.
+
+    service() is called from the button poll timer, but only on polls
+    that saw no button edge, so a command is handled like one more button
+    action: the button always goes first, and at most one command runs per
+    poll. It checks the stream with a zero timeout poll, reads at most
+    MAX_BYTES_PER_SERVICE bytes, one at a time through a preallocated byte,
+    into a fixed LINE_MAX buffer and runs a command only once a full line
+    has arrived, so it never waits on the host. start, stop and save block
+    the poll for as long as the matching button action would (stop: the
+    pin5 pulse and red LED, 1.25 s). Replies are single lines starting
+    with OK or ERR, which keeps them apart from the controller's debug
+    prints on the same port.
+    """
+
+    def __init__(self, water_filter, stream=None, out=None):
+        self.filter = water_filter
+        if stream is None:
+            stream = sys.stdin
+        # Read raw bytes; MicroPython's sys.stdin.buffer has no extra buffering
+        self.reader = getattr(stream, 'buffer', stream)
+        self.out = out if out is not None else sys.stdout
+
+        self.poller = select.poll()
+        self.poller.register(stream, select.POLLIN)
+        # ipoll (MicroPython) avoids allocating a result list on every tick
+        self.poll = getattr(self.poller, 'ipoll', self.poller.poll)
+
+        self.line = bytearray(LINE_MAX)
+        self.byte = bytearray(1)
+        self.length = 0
+        self.overflow = False
+
+    def _readable(self):
+        for _, event in self.poll(0):
+            if event & select.POLLIN:
+                return True
+        return False
+
+    def service(self):
+        """Read whatever is waiting (bounded) and run at most one completed command"""
+        for _ in range(MAX_BYTES_PER_SERVICE):
+            if not self._readable():
+                return
+            if not self.reader.readinto(self.byte):
+                return
+            byte = self.byte[0]
+            if byte == 0x0A:  # '\n' ends a command
+                # Reset first so a failing command can't wedge the buffer
+                length = self.length
+                overflow = self.overflow
+                self.length = 0
+                self.overflow = False
+                if overflow:
+                    self.reply("ERR line too long")
+                    return
+                if length:
+                    # Commands can block (stop, save), so time them exactly
+                    self.filter.stats.begin_work('poll')
+                    self.run(bytes(self.line[:length]))
+                    self.filter.stats.end_work()
+                    return
+            elif byte == 0x0D:  # Ignore '\r' from terminals sending CRLF
+                pass
+            elif self.length < LINE_MAX:
+                self.line[self.length] = byte
+                self.length += 1
+            else:
+                self.overflow = True
+
+    def reply(self, text):
+        self.out.write(text + "\n")
+
+    def run(self, data):
+        """Decode and run one command line and write its reply"""
+        try:
+            line = data.decode()
+        except UnicodeError:
+            self.reply("ERR invalid characters")
+            return
+        words = line.split()
+        if not words:
+            return
+        try:
+            self.reply(self.execute(words[0].lower(), words[1:]))
+        except (ValueError, IndexError):
+            self.reply("ERR bad arguments: " + line)
+
+    def execute(self, command, args):
+        """Execute a command and return the reply line"""
+        wf = self.filter
+        if command == 'get':
+            if args and args[0] == 'preset':
+                return "OK " + str(wf.presets[self._slot(args[1])])
+            presets = ','.join(str(p) for p in wf.presets)
+            return "OK state=" + wf.state + " presets=" + presets
+
+        elif command == 'set':
+            slot = self._slot(args[0])
+            duration = int(args[1])
+            if duration <= 0:
+                raise ValueError("duration must be positive")
+            wf.presets[slot] = duration
+            return "OK preset " + str(slot + 1) + "=" + str(duration)
+
+        elif command == 'save':
+            if save_to_file(wf.presets):
+                return "OK saved"
+            return "ERR save failed"
+
+        elif command == 'start':
+            slot = self._slot(args[0]) if args else 0
+            if wf.state not in (wf.IDLE, wf.SLEEPING):
+                return "ERR busy: " + wf.state
+            wf.start_preset(slot)
+            return "OK started preset " + str(slot + 1)
+
+        elif command == 'stop':
+            if wf.state != wf.BLINKING:
+                return "ERR not running: " + wf.state
+            wf.stop_sequence()
+            return "OK stopped"
+
+        elif command == 'stats':
+            if args and args[0] == 'reset':
+                wf.stats.reset()
+                return "OK stats reset"
+            parts = []
+            for state, entry in wf.stats.summary().items():
+                parts.append(state + "=" + str(entry['time_ms']) + "ms," +
+                             str(entry['wakeups']) + "w," + str(entry['busy_us']) + "us")
+            return "OK " + ' '.join(parts)
+
+        elif command == 'help':
+            return "OK " + HELP
+
+        return "ERR unknown command: " + command
+
+    def _slot(self, text):
+        """Convert a 1-based preset number to a slot index"""
+        slot = int(text) - 1
+        if not 0 <= slot < PRESET_COUNT:
+            raise ValueError("no such preset")
+        return slot
@@ -0,0 +1,93 @@
+import unittest
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+from hal import SimBackend, RecordingBackend
+from water_filter import WaterFilter, CONTROL_PIN, PIN5_ON_TIME_MS
+
+# Run in a fresh interpreter: fake machine/neopixel modules record every
+# Pin, Timer and NeoPixel created, and open() is patched to record file access
+IMPORT_CHECK = """
+import json, sys, types
+from unittest import mock
+created = []
+class Recorder:
+    IN = OUT = PULL_DOWN = PERIODIC = ONE_SHOT = 0
+    def __init__(self, *args, **kwargs):
+        created.append(type(self).__name__)
+machine = types.ModuleType('machine')
+machine.Pin = type('Pin', (Recorder,), {})
+machine.Timer = type('Timer', (Recorder,), {})
+neopixel = types.ModuleType('neopixel')
+neopixel.NeoPixel = type('NeoPixel', (Recorder,), {})
+sys.modules['machine'] = machine
+sys.modules['neopixel'] = neopixel
+with mock.patch('builtins.open') as mock_open:
+    import hal, water_filter, led_renderer, wake_stats, serial_control
+print(json.dumps({'open_calls': mock_open.call_count, 'created': created}))
+"""
+
+class TestImport(unittest.TestCase):
+    def test_library_import_has_no_side_effects(self):
+        """Importing the library must not read settings, touch hardware or loop"""
+        here = os.path.dirname(os.path.abspath(__file__))
+        result = subprocess.run([sys.executable, '-c', IMPORT_CHECK], cwd=here,
+                                capture_output=True, text=True, timeout=10)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertEqual(report['open_calls'], 0)
+        self.assertEqual(report['created'], [])
+
+class TestSimBackend(unittest.TestCase):
+    def setUp(self):
+        self.hal = SimBackend()
+
+    def test_periodic_timer_fires_on_advance(self):
+        fired = []
+        timer = self.hal.timer()
+        timer.init(period=100, mode=self.hal.PERIODIC, callback=lambda t: fired.append(self.hal.ticks_ms()))
+        self.hal.advance(350)
+        self.assertEqual(fired, [100, 200, 300])
+        self.assertEqual(self.hal.ticks_ms(), 350)
+
+    def test_one_shot_timer_fires_once(self):
+        fired = []
+        timer = self.hal.timer()
+        timer.init(period=50, mode=self.hal.ONE_SHOT, callback=lambda t: fired.append(True))
+        self.hal.advance(500)
+        self.assertEqual(fired, [True])
+        self.assertNotIn(timer, self.hal.timers)
+
+    def test_deinit_stops_timer(self):
+        fired = []
+        timer = self.hal.timer()
+        timer.init(period=10, mode=self.hal.PERIODIC, callback=lambda t: fired.append(True))
+        timer.deinit()
+        self.hal.advance(100)
+        self.assertEqual(fired, [])
+
+class TestRecordingBackend(unittest.TestCase):
+    @patch('water_filter.read_presets', return_value=[3000, 6000, 9000])
+    def test_short_press_cycle(self, mock_read):
+        hal = RecordingBackend()
+        wf = WaterFilter(hal)
+        button = hal.pins[27]
+
+        button.value(1)
+        hal.advance(300)
+        button.value(0)
+        hal.advance(200)
+        self.assertEqual(wf.state, 'BLINKING')
+
+        hal.advance(3000)
+        self.assertEqual(wf.state, 'IDLE')
+
+        # Pin5 pulsed LOW at start and at completion, each for PIN5_ON_TIME_MS
+        pulses = [e for e in hal.filter('pin', CONTROL_PIN) if e[3] == 0]
+        self.assertEqual(len(pulses), 2)
+        self.assertIn((pulses[0][0], 'sleep', None, PIN5_ON_TIME_MS), hal.events)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+from test_mocks import MockTimer, MockNeoPixel
+from neopixel_colors import (
+    GREEN_LOW, BLUE_LOW, OFF,
+    gamma_table, ease_in_out_table, breathe_table,
+    EASE_CURVE, BREATHE_CURVE, CURVE_STEPS
+)
+from led_renderer import LEDRenderer
+
+class CountingNeoPixel(MockNeoPixel):
+    def __init__(self, pin, num_leds):
+        super().__init__(pin, num_leds)
+        self.writes = 0
+
+    def write(self):
+        self.writes += 1
+
+class FakeClock:
+    """Millisecond clock advanced by the test"""
+    def __init__(self):
+        self.now = 0
+
+    def ticks_ms(self):
+        return self.now
+
+    def ticks_us(self):
+        return self.now * 1000
+
+    def ticks_diff(self, end, start):
+        return end - start
+
+class TestColorTables(unittest.TestCase):
+    def test_gamma_table_endpoints(self):
+        table = gamma_table()
+        self.assertEqual(len(table), 256)
+        self.assertEqual(table[0], 0)
+        self.assertEqual(table[255], 255)
+        self.assertLess(table[128], 128)  # Gamma darkens the midrange
+
+    def test_ease_table_is_monotonic(self):
+        table = ease_in_out_table(50)
+        self.assertEqual(table[0], 0)
+        self.assertEqual(table[-1], 255)
+        self.assertEqual(list(table), sorted(table))
+
+    def test_breathe_table_returns_to_start(self):
+        table = breathe_table(40)
+        self.assertEqual(table[0], 0)
+        self.assertEqual(max(table), 255)
+        self.assertLess(table[-1], 10)
+
+    def test_precomputed_curves(self):
+        self.assertEqual(len(EASE_CURVE), CURVE_STEPS)
+        self.assertEqual(len(BREATHE_CURVE), CURVE_STEPS)
+        self.assertEqual((EASE_CURVE[0], EASE_CURVE[-1]), (0, 255))
+        self.assertEqual(max(BREATHE_CURVE), 255)
+
+class TestLEDRenderer(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.np = CountingNeoPixel(None, 1)
+        self.timer = MockTimer()
+        self.renderer = LEDRenderer(self.np, self.timer, fps=50, clock=self.clock)
+
+    def advance(self, ms):
+        self.clock.now += ms
+        self.timer.trigger()
+
+    def test_fade_reaches_end_and_calls_done(self):
+        done = []
+        self.renderer.fade(GREEN_LOW, OFF, 200, lambda: done.append(True))
+        self.assertEqual(self.np[0], GREEN_LOW.to_grb())
+        self.assertEqual(self.timer.period, 20)
+        for _ in range(10):
+            self.advance(20)
+        self.assertEqual(self.np[0], OFF.to_grb())
+        self.assertEqual(done, [True])
+        self.assertFalse(self.renderer.running)
+
+    def test_unchanged_frame_is_not_written(self):
+        self.renderer.fade(GREEN_LOW, GREEN_LOW, 200)
+        writes = self.np.writes
+        for _ in range(5):
+            self.advance(20)
+        self.assertEqual(self.np.writes, writes)
+
+    def test_crossfade_ends_on_target(self):
+        self.renderer.fade(GREEN_LOW, BLUE_LOW, 100)
+        for _ in range(5):
+            self.advance(20)
+        self.assertEqual(self.np[0], BLUE_LOW.to_grb())
+
+    def test_late_tick_drops_frames(self):
+        self.renderer.fade(GREEN_LOW, BLUE_LOW, 1000)
+        self.advance(500)  # One tick arriving 25 frames late
+        self.assertEqual(self.renderer.last_frame, 25)
+        self.assertEqual(self.renderer.frames_dropped, 24)
+
+    def test_breathe_loops(self):
+        self.renderer.breathe(GREEN_LOW.to_grb(), 400)
+        self.advance(420)
+        self.assertTrue(self.renderer.running)
+        # Wrapped around to the dim start of the next breath
+        self.assertLess(self.np[0][0], 5)
+        self.renderer.stop()
+        self.assertIsNone(self.timer.callback)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,4 @@
-from neopixel_colors import Color, OFF
+from neopixel_colors import Color, OFF, GREEN_LOW
 
 class MockPin:
     IN = 'IN'
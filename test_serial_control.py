@@ -0,0 +1,145 @@
+import unittest
+import io
+import os
+from unittest.mock import Mock, patch
+from hal import SimBackend
+from serial_control import SerialControl, LINE_MAX, MAX_BYTES_PER_SERVICE
+from water_filter import WaterFilter
+
+class TestSerialControl(unittest.TestCase):
+    """Commands fed through a pipe, replies collected in a StringIO"""
+    def setUp(self):
+        self.hal = SimBackend()
+        self.filter = WaterFilter(self.hal)
+        read_fd, self.write_fd = os.pipe()
+        self.stream = open(read_fd, 'rb', buffering=0)
+        self.out = io.StringIO()
+        self.control = SerialControl(self.filter, self.stream, self.out)
+
+    def tearDown(self):
+        self.stream.close()
+        os.close(self.write_fd)
+
+    def send(self, data):
+        os.write(self.write_fd, data)
+
+    def replies(self):
+        return self.out.getvalue().splitlines()
+
+    def test_no_input_does_not_block(self):
+        self.control.service()
+        self.assertEqual(self.replies(), [])
+
+    def test_get(self):
+        self.filter.presets = [1000, 2000, 3000]
+        self.send(b"get\r\nget preset 2\n")
+        self.control.service()
+        self.control.service()
+        self.assertEqual(self.replies(), ["OK state=IDLE presets=1000,2000,3000", "OK 2000"])
+
+    def test_partial_line_waits_for_newline(self):
+        self.send(b"ge")
+        self.control.service()
+        self.assertEqual(self.replies(), [])
+        self.send(b"t\n")
+        self.control.service()
+        self.assertEqual(len(self.replies()), 1)
+
+    def test_set_and_save(self):
+        self.send(b"set 3 12345\n")
+        self.control.service()
+        self.assertEqual(self.filter.presets[2], 12345)
+        with patch('builtins.open') as mock_open:
+            mock_file = Mock()
+            mock_open.return_value.__enter__.return_value = mock_file
+            self.send(b"save\n")
+            self.control.service()
+            mock_file.write.assert_called_with(f"{self.filter.presets[0]},{self.filter.presets[1]},12345")
+        self.assertEqual(self.replies(), ["OK preset 3=12345", "OK saved"])
+
+    def test_bad_arguments(self):
+        self.send(b"set 4 100\nset 1 abc\nfoo\n")
+        for _ in range(3):
+            self.control.service()
+        replies = self.replies()
+        self.assertEqual(len(replies), 3)
+        self.assertTrue(all(r.startswith("ERR") for r in replies))
+
+    def test_start_and_stop(self):
+        self.filter.presets = [1000, 2000, 3000]
+        self.send(b"start 2\n")
+        self.control.service()
+        self.assertEqual(self.filter.state, 'BLINKING')
+        self.assertEqual(self.filter.start_timer.period, 2000)
+        self.send(b"stop\n")
+        self.control.service()
+        self.assertEqual(self.filter.state, 'IDLE')
+        self.assertEqual(self.replies(), ["OK started preset 2", "OK stopped"])
+
+    def test_stats(self):
+        self.hal.advance(1000)
+        self.send(b"stats\n")
+        self.control.service()
+        self.assertTrue(self.replies()[0].startswith("OK IDLE=1000ms,10w,"))
+
+    def test_invalid_bytes_rejected(self):
+        self.filter.control = self.control
+        self.send(b"\xff\n")
+        self.hal.advance(100)  # Must not raise out of the button poll
+        self.send(b"help\n")
+        self.hal.advance(100)
+        replies = self.replies()
+        self.assertEqual(replies[0], "ERR invalid characters")
+        self.assertTrue(replies[1].startswith("OK"))
+
+    def test_overlong_line_rejected(self):
+        self.send(b"x" * (LINE_MAX + 1) + b"\n")
+        while not self.replies():
+            self.control.service()
+        self.assertEqual(self.replies(), ["ERR line too long"])
+
+    def test_service_reads_bounded_bytes(self):
+        self.send(b"y" * (MAX_BYTES_PER_SERVICE * 2))
+        self.control.service()
+        self.assertEqual(self.control.length, MAX_BYTES_PER_SERVICE)
+
+    def test_serviced_from_button_poll(self):
+        self.filter.control = self.control
+        self.send(b"help\n")
+        self.hal.advance(100)
+        self.assertTrue(self.replies()[0].startswith("OK"))
+
+    def test_one_command_per_service(self):
+        self.send(b"help\nhelp\n")
+        self.control.service()
+        self.assertEqual(len(self.replies()), 1)
+        self.control.service()
+        self.assertEqual(len(self.replies()), 2)
+
+    def test_command_waits_for_poll_without_button_edge(self):
+        self.filter.control = self.control
+        self.send(b"get\n")
+        self.filter.button.value(1)
+        self.hal.advance(100)  # The press is handled, the command waits
+        self.assertEqual(self.replies(), [])
+        self.hal.advance(100)
+        self.assertEqual(self.replies(), ["OK state=IDLE presets=" +
+                                          ','.join(str(p) for p in self.filter.presets)])
+
+@unittest.skipUnless(hasattr(os, 'openpty'), "needs a pty")
+class TestSerialClient(unittest.TestCase):
+    def test_round_trip_over_pty(self):
+        from serial_client import open_sim
+        client, wf = open_sim()
+        try:
+            self.assertEqual(client.command("set 1 4000"), "OK preset 1=4000")
+            self.assertEqual(client.command("start"), "OK started preset 1")
+            self.assertEqual(wf.state, 'BLINKING')
+            self.assertTrue(client.command("get").startswith("OK state=BLINKING presets=4000,"))
+        finally:
+            client.close()
+            wf.control.reader.close()
+            wf.control.out.close()
+
+if __name__ == '__main__':
+    unittest.main()
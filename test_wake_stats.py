@@ -0,0 +1,99 @@
+import unittest
+from hal import SimBackend
+from wake_stats import WakeStats, POLL_SAMPLE
+from water_filter import WaterFilter
+
+class WrappingSim(SimBackend):
+    """SimBackend whose ticks wrap like the device's, only much sooner"""
+    PERIOD = 1 << 16
+
+    def ticks_ms(self):
+        return (self.now_us // 1000) % self.PERIOD
+
+    def ticks_us(self):
+        return self.now_us % self.PERIOD
+
+    def ticks_diff(self, end, start):
+        half = self.PERIOD // 2
+        return (end - start + half) % self.PERIOD - half
+
+class TestWakeStats(unittest.TestCase):
+    def setUp(self):
+        self.hal = SimBackend()
+        self.stats = WakeStats(('IDLE', 'BLINKING'), clock=self.hal)
+
+    def test_wakeups_attributed_to_state_and_source(self):
+        timer = self.stats.timer(self.hal.timer(), 'blink')
+        timer.init(period=100, mode=self.hal.PERIODIC, callback=lambda t: self.hal.sleep_ms(10))
+        self.hal.advance(1000)
+        self.stats.enter_state('BLINKING')
+        self.hal.advance(500)
+
+        summary = self.stats.summary()
+        self.assertEqual(summary['IDLE']['wakeups'], 10)
+        self.assertEqual(summary['IDLE']['sources']['blink'], (10, 100000))
+        self.assertEqual(summary['BLINKING']['wakeups'], 5)
+        self.assertEqual(summary['total']['wakeups'], 15)
+        self.assertAlmostEqual(summary['IDLE']['wakeups_per_sec'], 10, delta=1)
+        self.assertAlmostEqual(summary['total']['busy_fraction'], 0.1, delta=0.01)
+
+    def test_poll_busy_time_is_sampled(self):
+        polls = []
+
+        def poll(timer):
+            polls.append(True)
+            self.hal.sleep_ms(1)
+            if len(polls) == 5:  # One poll with real work, timed exactly
+                self.stats.begin_work('poll')
+                self.hal.sleep_ms(50)
+                self.stats.end_work()
+
+        timer = self.stats.timer(self.hal.timer(), 'poll')
+        timer.init(period=100, callback=poll)
+        self.hal.advance(100 * POLL_SAMPLE * 2 + 300)
+
+        wakeups, busy_us = self.stats.summary()['IDLE']['sources']['poll']
+        self.assertEqual(wakeups, POLL_SAMPLE * 2 + 3)
+        # Two sampled polls scaled up, plus the work counted once
+        self.assertEqual(busy_us, 2 * POLL_SAMPLE * 1000 + 50000)
+
+    def test_reset_clears_counters(self):
+        timer = self.stats.timer(self.hal.timer(), 'blink')
+        timer.init(period=50, callback=lambda t: None)
+        self.hal.advance(200)
+        self.stats.reset()
+        self.assertEqual(self.stats.summary()['total']['wakeups'], 0)
+
+    def test_accounted_timer_passes_through(self):
+        timer = self.stats.timer(self.hal.timer(), 'idle')
+        timer.init(period=100, mode=self.hal.ONE_SHOT, callback=lambda t: None)
+        self.assertEqual(timer.period, 100)
+        timer.deinit()
+        self.assertIsNone(timer.callback)
+
+    def test_time_survives_tick_wrap(self):
+        hal = WrappingSim()
+        stats = WakeStats(('IDLE', 'BLINKING'), clock=hal)
+        timer = stats.timer(hal.timer(), 'poll')
+        timer.init(period=100, callback=lambda t: None)
+        # Several wraps of both the ms (65 s) and us (65 ms) ticks
+        hal.advance(300000)
+        stats.enter_state('BLINKING')
+        hal.advance(100000)
+
+        summary = stats.summary()
+        self.assertEqual(summary['IDLE']['time_ms'], 300000)
+        self.assertEqual(summary['BLINKING']['time_ms'], 100000)
+        self.assertEqual(summary['total']['time_ms'], 400000)
+        self.assertEqual(summary['total']['wakeups'], 4000)
+
+class TestControllerAccounting(unittest.TestCase):
+    def test_poll_wakeups_while_idle(self):
+        hal = SimBackend()
+        wf = WaterFilter(hal)
+        hal.advance(1000)
+        summary = wf.stats.summary()
+        self.assertEqual(summary['IDLE']['sources']['poll'][0], 10)
+
+if __name__ == '__main__':
+    unittest.main()
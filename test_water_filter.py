@@ -1,14 +1,12 @@
 import unittest
 from unittest.mock import Mock, patch
-import time
-import sys
-from test_mocks import MockPin, MockTimer, MockNeoPixel
+from hal import SimBackend, RecordingBackend
 from neopixel_colors import (
     Color, OFF, RED_LOW, GREEN_LOW, 
     BLUE_LOW, ORANGE_LOW
 )
 
-# Add constants needed from main.py
+# Add constants needed from water_filter.py
 LED_PIN = 16
 BUTTON_PIN = 27
 CONTROL_PIN = 5
@@ -18,35 +16,21 @@ CONFIG_BLINK_PERIOD_MS = 200
 DEFAULT_BLINK_TIME = 50000
 PIN5_ON_TIME_MS = 250
 RED_SHOW_TIME_MS = 1000
+CLICK_WINDOW_MS = 400
 
-# Mock the modules before importing main
-sys.modules['machine'] = Mock()
-sys.modules['machine'].Pin = MockPin
-sys.modules['machine'].Timer = MockTimer
-sys.modules['neopixel'] = Mock()
-sys.modules['neopixel'].NeoPixel = MockNeoPixel
-
-# Now import from main
-from main import WaterFilter, LEDController
+# The library imports without touching hardware; tests run on the simulator
+from water_filter import WaterFilter, LEDController
 
 # Create the test class
 class TestWaterFilter(unittest.TestCase):
     def setUp(self):
-        self.filter = WaterFilter()
-        self.current_time = 0
-        # Mock time.ticks_ms
-        self.original_ticks_ms = time.ticks_ms
-        time.ticks_ms = lambda: self.current_time
-        
-        # Add after the time.ticks_ms mock in setUp
-        def mock_ticks_diff(end, start):
-            return end - start
-        time.ticks_diff = mock_ticks_diff
+        self.hal = SimBackend()
+        self.filter = WaterFilter(self.hal)
         
     def simulate_time_ms(self, ms):
-        """Helper to simulate time passage"""
-        self.current_time += ms
-        return self.current_time
+        """Helper to simulate time passage (without firing timers)"""
+        self.hal.now_us += ms * 1000
+        return self.hal.ticks_ms()
         
     def test_initial_state(self):
         """Test initial state of the controller"""
@@ -60,7 +44,7 @@ class TestWaterFilter(unittest.TestCase):
         self.filter._handle_button_press(0)
         
         # Verify blue LED on press
-        self.assertEqual(self.filter.led.led[0], BLUE_LOW.to_grb())
+        self.assertEqual(self.filter.led.led[0], LEDController.BLUE_LOW)
         
         # Simulate button release after 1 second
         self.filter.button.value = lambda: 0
@@ -106,14 +90,14 @@ class TestWaterFilter(unittest.TestCase):
     def test_completion_sequence(self):
         """Test the completion sequence"""
         # Start completion sequence
-        self.filter._execute_action()
+        self.filter._execute_stop_to_idle_action()
         
         # Verify Pin 5 was pulsed LOW
         self.assertEqual(self.filter.pin5.value(), 1)  # Should be back to HIGH
         
         # Verify final state
         self.assertEqual(self.filter.state, 'IDLE')
-        self.assertEqual(self.filter.led.led[0], GREEN_LOW.to_grb())
+        self.assertEqual(self.filter.led.led[0], LEDController.GREEN_LOW)
         
     @patch('builtins.open')
     def test_training_mode_save(self, mock_open):
@@ -137,23 +121,23 @@ class TestWaterFilter(unittest.TestCase):
         self.filter.state = 'INVALID'
         
         # Execute action should recover to IDLE
-        self.filter._execute_action()
+        self.filter._execute_stop_to_idle_action()
         self.assertEqual(self.filter.state, 'IDLE')
 
     def test_led_colors(self):
         """Test LED color states match requirements"""
         # Test idle state (green)
-        self.assertEqual(self.filter.led.led[0], GREEN_LOW.to_grb())
+        self.assertEqual(self.filter.led.led[0], LEDController.GREEN_LOW)
         
         # Test button press (blue)
         self.filter.button.value = lambda: 1
         self.filter._handle_button_press(0)
-        self.assertEqual(self.filter.led.led[0], BLUE_LOW.to_grb())
+        self.assertEqual(self.filter.led.led[0], LEDController.BLUE_LOW)
         
         # Test completion sequence
-        self.filter._execute_action()
+        self.filter._execute_stop_to_idle_action()
         # Should end with green
-        self.assertEqual(self.filter.led.led[0], GREEN_LOW.to_grb())
+        self.assertEqual(self.filter.led.led[0], LEDController.GREEN_LOW)
 
     def test_training_mode_indicators(self):
         """Test training mode LED indicators"""
@@ -167,7 +151,7 @@ class TestWaterFilter(unittest.TestCase):
             self.filter._handle_button_release(5000)
             
             # Should flash orange then end in green
-            self.assertEqual(self.filter.led.led[0], GREEN_LOW.to_grb())
+            self.assertEqual(self.filter.led.led[0], LEDController.GREEN_LOW)
 
     def test_timing_requirements(self):
         """Test timing requirements are met"""
@@ -190,14 +174,14 @@ class TestWaterFilter(unittest.TestCase):
         with patch('builtins.open') as mock_open:
             mock_file = Mock()
             mock_open.return_value.__enter__.return_value = mock_file
-            from main import save_to_file  # Import the function
+            from water_filter import save_to_file  # Import the function
             save_result = save_to_file(test_duration)
             self.assertTrue(save_result)
             mock_file.write.assert_called_with(str(test_duration))
         
         # Test loading with default
         with patch('builtins.open', side_effect=OSError):
-            from main import read_from_file  # Import the function
+            from water_filter import read_from_file  # Import the function
             duration = read_from_file()
             self.assertEqual(duration, DEFAULT_BLINK_TIME)  # Should return default value
 
@@ -207,14 +191,14 @@ class TestWaterFilter(unittest.TestCase):
         self.assertEqual(self.filter.pin5.value(), 1)
         
         # Execute action should pulse LOW then return to HIGH
-        self.filter._execute_action()
+        self.filter._execute_stop_to_idle_action()
         self.assertEqual(self.filter.pin5.value(), 1)  # Should end HIGH
 
     def test_exact_timing(self):
         """Test exact timing requirements"""
         # Mock time.sleep_ms to track sleep durations
-        with patch('time.sleep_ms') as mock_sleep:
-            self.filter._execute_action()
+        with patch.object(self.hal, 'sleep_ms') as mock_sleep:
+            self.filter._execute_stop_to_idle_action()
             
             # Verify PIN5 pulse timing
             mock_sleep.assert_any_call(250)  # PIN5_ON_TIME_MS
@@ -238,14 +222,39 @@ class TestWaterFilter(unittest.TestCase):
 
     def test_rapid_button_presses(self):
         """Test multiple rapid button presses"""
+        # Press 1 starts a sequence, presses 2 and 3 fall inside the click
+        # window and promote it, press 4 is past the largest preset and
+        # cancels, and press 5 starts a new single-click sequence
+        expected = [('BLINKING', 1), ('BLINKING', 2), ('BLINKING', 3),
+                    ('IDLE', 3), ('BLINKING', 1)]
         for i in range(5):  # Simulate 5 rapid presses
             self.filter.button.value = lambda: 1
             self.filter._handle_button_press(i * 50)  # 50ms apart
             self.filter.button.value = lambda: 0
             self.filter._handle_button_release((i * 50) + 25)
+            self.assertEqual((self.filter.state, self.filter.click_count), expected[i])
         
-        # Should handle gracefully and end in IDLE state
-        self.assertEqual(self.filter.state, 'IDLE')
+        # No cancellation left pending
+        self.assertFalse(self.filter.canceling)
+
+    def test_press_during_sleep_fade_stops_fade(self):
+        """Test a sequence started while the LED fades to sleep stops the fade"""
+        self.hal.advance(5000 + 300)  # Idle timeout, 300ms into the fade
+        self.assertEqual(self.filter.state, 'SLEEPING')
+        self.assertTrue(self.filter.led.renderer.running)
+        
+        self.filter.button.value(1)
+        self.hal.advance(100)
+        self.filter.button.value(0)
+        self.hal.advance(100)
+        self.assertEqual(self.filter.state, 'BLINKING')
+        self.assertFalse(self.filter.led.renderer.running)
+        
+        # Past the end of the fade: blinking continues in phase
+        self.hal.advance(1000)
+        self.assertEqual(self.filter.state, 'BLINKING')
+        self.assertTrue(self.filter.led.is_on)
+        self.assertEqual(self.filter.led.led[0], LEDController.GREEN_LOW)
 
     def test_file_system_errors(self):
         """Test file system error conditions"""
@@ -260,7 +269,7 @@ class TestWaterFilter(unittest.TestCase):
             
             # Should handle error gracefully
             self.assertEqual(self.filter.state, 'IDLE')
-            self.assertEqual(self.filter.led.led[0], GREEN_LOW.to_grb())
+            self.assertEqual(self.filter.led.led[0], LEDController.GREEN_LOW)
 
     def test_color_handling(self):
         """Test color object handling and conversion"""
@@ -289,9 +298,144 @@ class TestWaterFilter(unittest.TestCase):
             (int(165 * 0.25), int(255 * 0.25), 0)  # GRB order
         )
 
-    def tearDown(self):
-        # Restore original time.ticks_ms
-        time.ticks_ms = self.original_ticks_ms
+    def click(self, press_time, release_time):
+        """Helper to simulate one press/release"""
+        self.filter.button.value = lambda: 1
+        self.filter._handle_button_press(press_time)
+        self.filter.button.value = lambda: 0
+        self.filter._handle_button_release(release_time)
+
+    def test_single_click_starts_immediately(self):
+        """Test single click starts the small preset without a click window delay"""
+        self.filter.presets = [10000, 20000, 30000]
+        self.click(0, 100)
+        self.assertEqual(self.filter.state, 'BLINKING')
+        self.assertEqual(self.filter.start_timer.period, 10000)
+
+    def test_double_click_promotes_sequence(self):
+        """Test second click inside the window promotes to the medium preset"""
+        self.filter.presets = [10000, 20000, 30000]
+        self.click(0, 100)
+        self.click(300, 400)
+        self.assertEqual(self.filter.state, 'BLINKING')
+        self.assertFalse(self.filter.canceling)
+        self.assertEqual(self.filter.click_count, 2)
+        # Remaining time is measured from when the first click armed its timer
+        self.assertEqual(self.filter.start_timer.period, 20000 - (300 - self.filter.sequence_start))
+
+    def test_triple_click_promotes_to_large(self):
+        """Test third click promotes to the large preset"""
+        self.filter.presets = [10000, 20000, 30000]
+        self.click(0, 100)
+        self.click(300, 400)
+        self.click(600, 700)
+        self.assertEqual(self.filter.click_count, 3)
+        self.assertEqual(self.filter.start_timer.period, 30000 - (600 - self.filter.sequence_start))
+
+    def test_press_after_click_window_cancels(self):
+        """Test press after the click window still cancels the sequence"""
+        self.click(0, 100)
+        self.filter.button.value = lambda: 1
+        self.filter._handle_button_press(100 + CLICK_WINDOW_MS + 1)
+        self.assertTrue(self.filter.canceling)
+        self.assertEqual(self.filter.state, 'IDLE')
+
+    def test_click_and_hold_trains_second_preset(self):
+        """Test click followed by a long press trains the medium preset"""
+        self.click(0, 100)
+        self.simulate_time_ms(300)
+        self.filter.button.value = lambda: 1
+        self.filter._handle_button_press(300)
+        self.simulate_time_ms(BUTTON_LONG_PRESS_MS)
+        self.filter.long_press_timer.trigger()
+        self.assertEqual(self.filter.state, 'TRAINING')
+        self.assertIsNone(self.filter.start_timer.callback)
+
+        # Measured from when the first click started the dispense
+        trained = 300 + 4000 - self.filter.sequence_start
+        with patch('builtins.open') as mock_open:
+            mock_file = Mock()
+            mock_open.return_value.__enter__.return_value = mock_file
+            self.filter.button.value = lambda: 0
+            self.filter._handle_button_release(300 + 4000)
+            mock_file.write.assert_called_with(f"{DEFAULT_BLINK_TIME},{trained},{3 * DEFAULT_BLINK_TIME}")
+        self.assertEqual(self.filter.presets[1], trained)
+        self.assertEqual(self.filter.state, 'IDLE')
+
+        # Playing the preset back dispenses exactly as long as was trained
+        self.click(10000, 10100)
+        self.click(10300, 10400)
+        played = self.filter.start_timer.period + (10300 - self.filter.sequence_start)
+        self.assertEqual(played, trained)
+
+    def test_read_presets(self):
+        """Test presets are read from file, with defaults for missing slots"""
+        from water_filter import read_presets
+        with patch('builtins.open') as mock_open:
+            mock_open.return_value.__enter__.return_value.read = Mock(return_value="12000")
+            self.assertEqual(read_presets(), [12000, 2 * DEFAULT_BLINK_TIME, 3 * DEFAULT_BLINK_TIME])
+        with patch('builtins.open') as mock_open:
+            mock_open.return_value.__enter__.return_value.read = Mock(return_value="1,2,3")
+            self.assertEqual(read_presets(), [1, 2, 3])
+
+class TestPresetTiming(unittest.TestCase):
+    """Pin5 pulse timing, driving the button through the simulated clock"""
+    def setUp(self):
+        self.hal = RecordingBackend()
+        self.filter = WaterFilter(self.hal)
+        self.filter.presets = [3000, 6000, 9000]
+
+    def press(self, hold_ms):
+        self.filter.button.value(1)
+        self.hal.advance(hold_ms)
+        self.filter.button.value(0)
+
+    def pin5_low_times(self):
+        return [e[0] for e in self.hal.filter('pin', CONTROL_PIN) if e[3] == 0]
+
+    def test_single_and_double_click_dispense_alike(self):
+        """Test every preset runs its duration between the start and stop pulses"""
+        self.press(100)
+        self.hal.advance(5000)
+        start, stop = self.pin5_low_times()
+        self.assertEqual(stop - start, 3000 + PIN5_ON_TIME_MS)
+        
+        self.hal.advance(2000)
+        self.press(100)
+        self.hal.advance(200)
+        self.press(100)
+        self.hal.advance(8000)
+        start, stop = self.pin5_low_times()[2:]
+        self.assertEqual(stop - start, 6000 + PIN5_ON_TIME_MS)
+        
+        # Started without the button (serial "start 3")
+        self.hal.advance(2000)
+        self.filter.start_preset(2)
+        self.hal.advance(11000)
+        start, stop = self.pin5_low_times()[4:]
+        self.assertEqual(stop - start, 9000 + PIN5_ON_TIME_MS)
+
+    def test_training_second_preset_stops_dispense_at_release(self):
+        """Test training a promoted preset stops the dispense when released"""
+        self.press(100)
+        self.hal.advance(200)
+        self.filter.button.value(1)
+        self.hal.advance(BUTTON_LONG_PRESS_MS + 2000)
+        self.assertEqual(self.filter.state, 'TRAINING')
+        
+        release = self.hal.ticks_ms()
+        with patch('builtins.open'):
+            self.filter.button.value(0)
+            self.hal.advance(100)  # The next poll sees the release
+        self.assertEqual(self.filter.state, 'IDLE')
+        trained = self.filter.presets[1]
+        
+        # One stop pulse, at the release rather than after the save
+        # feedback, spaced like playback would be
+        start, stop = self.pin5_low_times()
+        self.assertLessEqual(release, stop)
+        self.assertLess(stop, release + 100)
+        self.assertEqual(stop - start, trained + PIN5_ON_TIME_MS)
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
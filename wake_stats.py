@@ -0,0 +1,221 @@
+import time
+
+# Wakeup sources, one per controller timer
+SOURCES = ('poll', 'blink', 'idle', 'completion', 'long_press', 'render')
+POLL = 0  # Index of 'poll', the always running 10 Hz wakeup
+
+# Accounting Configuration
+POLL_SAMPLE = 16  # Time one poll wakeup in this many (must stay below 256)
+
+
+class WakeStats:
+    """Counts wakeups and busy time per controller state and wakeup source.
+
+    Counters live in flat preallocated lists indexed by
+    state * len(SOURCES) + source. The current state's base index is kept
+    in a one element list shared with the wrapped callbacks, so a wakeup
+    never looks up the state. Time spent in each state is tracked
+    separately (see enter_state) so wakeup rates and busy fractions can be
+    reported per state.
+
+    Busy time covers everything a callback does, including blocking
+    sleep_ms() calls made from inside it. Most wakeups are the 10 Hz poll
+    finding nothing to do, so poll wakeups are only counted, and one in
+    POLL_SAMPLE is timed and scaled up. The rare polls that do real work
+    (button edges, serial commands) time that work themselves with
+    begin_work()/end_work(), and it is taken out of the sample so it is
+    counted exactly once.
+
+    Time in state is kept in milliseconds. ticks_* wrap on the device
+    (ticks_us differences are only valid for about 9 minutes), so no
+    difference is ever taken over a long span: every timed poll wakeup
+    folds the time since the last fold into the current state.
+    """
+
+    def __init__(self, states, clock=time):
+        self.clock = clock
+        self.states = states
+        self.state_index = {}
+        for i, state in enumerate(states):
+            self.state_index[state] = i
+        self.current = 0
+        self.base = [0]
+        count = len(states) * len(SOURCES)
+        self.wakeups = [0] * count
+        self.busy_us = [0] * count
+        # Poll wakeups left until the next timed one; the ones already
+        # passed are not yet in wakeups (small ints, never allocated)
+        self.countdown = [POLL_SAMPLE]
+        self.work_slot = 0
+        self.work_start = 0
+        self.work_us = [0]  # All work timed by end_work(), for the sampler
+        self.state_ms = [0] * len(states)
+        self.reset()
+
+    def reset(self):
+        """Clear all counters and start a new measurement period"""
+        # Cleared in place: wrapped callbacks hold on to these lists
+        for i in range(len(self.wakeups)):
+            self.wakeups[i] = 0
+            self.busy_us[i] = 0
+        self.countdown[0] = POLL_SAMPLE
+        for i in range(len(self.state_ms)):
+            self.state_ms[i] = 0
+        self.state_since = self.clock.ticks_ms()
+
+    def fold(self):
+        """Add the time since the last fold to the current state"""
+        now = self.clock.ticks_ms()
+        self.state_ms[self.current] += self.clock.ticks_diff(now, self.state_since)
+        self.state_since = now
+
+    def enter_state(self, state):
+        """Record a state change, closing the time spent in the old state"""
+        self.fold()
+        self._flush_polls()
+        # Unknown states keep being accounted to the last known one
+        self.current = self.state_index.get(state, self.current)
+        self.base[0] = self.current * len(SOURCES)
+
+    def _flush_polls(self):
+        """Count the untimed poll wakeups so far in the current state"""
+        self.wakeups[self.base[0] + POLL] += POLL_SAMPLE - self.countdown[0]
+        self.countdown[0] = POLL_SAMPLE
+
+    def begin_work(self, source):
+        """Start timing work done inside a sampled wakeup of source"""
+        self.work_slot = self.base[0] + SOURCES.index(source)
+        self.work_start = self.clock.ticks_us()
+
+    def end_work(self):
+        """Account the work started by begin_work() as busy time"""
+        busy = self.clock.ticks_diff(self.clock.ticks_us(), self.work_start)
+        self.busy_us[self.work_slot] += busy
+        self.work_us[0] += busy
+
+    def timer(self, timer, source):
+        """Wrap a timer so its callbacks are accounted to source"""
+        return AccountedTimer(self, timer, SOURCES.index(source))
+
+    def wrap(self, source, callback):
+        """Return callback wrapped to count wakeups and busy time for source"""
+        # Bind everything the wrapper needs up front to keep each wakeup cheap
+        ticks_us = self.clock.ticks_us
+        ticks_diff = self.clock.ticks_diff
+        base = self.base
+        wakeups = self.wakeups
+        busy_us = self.busy_us
+
+        if source != POLL:
+            def accounted(timer):
+                slot = base[0] + source
+                start = ticks_us()
+                callback(timer)
+                wakeups[slot] += 1
+                busy_us[slot] += ticks_diff(ticks_us(), start)
+            return accounted
+
+        countdown = self.countdown
+        work_us = self.work_us
+        fold = self.fold
+
+        def sampled(timer):
+            left = countdown[0] - 1
+            if left:
+                # Counted before the callback so a state change it makes
+                # still credits this wakeup to the state it started in
+                countdown[0] = left
+                callback(timer)
+                return
+            slot = base[0] + source
+            countdown[0] = POLL_SAMPLE
+            wakeups[slot] += POLL_SAMPLE
+            work = work_us[0]
+            start = ticks_us()
+            callback(timer)
+            # Work timed by end_work() is already in busy_us
+            idle = ticks_diff(ticks_us(), start) - (work_us[0] - work)
+            busy_us[slot] += idle * POLL_SAMPLE
+            fold()
+        return sampled
+
+    def summary(self):
+        """Return counters per state as a dict.
+
+        Each state maps to its time in state, wakeups per second, busy
+        fraction and per-source wakeups and busy microseconds. The 'total'
+        entry covers the whole period since reset(). Poll busy time is an
+        estimate, see the class docstring.
+        """
+        self.fold()
+        self._flush_polls()
+        sources = len(SOURCES)
+
+        result = {}
+        total_wakeups = 0
+        total_busy = 0
+        for i, state in enumerate(self.states):
+            per_source = {}
+            wakeups = 0
+            busy = 0
+            for j, source in enumerate(SOURCES):
+                slot = i * sources + j
+                if self.wakeups[slot]:
+                    per_source[source] = (self.wakeups[slot], self.busy_us[slot])
+                wakeups += self.wakeups[slot]
+                busy += self.busy_us[slot]
+            result[state] = self._entry(self.state_ms[i], wakeups, busy, per_source)
+            total_wakeups += wakeups
+            total_busy += busy
+        result['total'] = self._entry(sum(self.state_ms), total_wakeups, total_busy, {})
+        return result
+
+    def _entry(self, time_ms, wakeups, busy_us, per_source):
+        return {
+            'time_ms': time_ms,
+            'wakeups': wakeups,
+            'wakeups_per_sec': wakeups * 1000 / time_ms if time_ms else 0,
+            'busy_us': busy_us,
+            'busy_fraction': busy_us / (time_ms * 1000) if time_ms else 0,
+            'sources': per_source,
+        }
+
+    def report(self):
+        """Print a summary table"""
+        summary = self.summary()
+        print("state       time_ms  wakeups   per_s  busy%")
+        for state, entry in summary.items():
+            busy_pct = entry['busy_fraction'] * 100
+            print(f"{state:<10}{entry['time_ms']:>9}{entry['wakeups']:>9}{entry['wakeups_per_sec']:>8.1f}{busy_pct:>7.2f}")
+            for source, (wakeups, busy_us) in entry['sources'].items():
+                print(f"  {source:<12}{wakeups:>14}  {busy_us}us busy")
+
+
+class AccountedTimer:
+    """Timer wrapper that accounts every callback to one wakeup source.
+
+    Anything other than init() is passed straight to the wrapped timer.
+    Timers are re-armed with the same callback over and over, so the last
+    wrapper is kept and reused rather than built on every init().
+    """
+
+    def __init__(self, stats, timer, source):
+        self.stats = stats
+        self.timer = timer
+        self.source = source
+        self.wrapped = None
+        self.accounted = None
+        # Called on every re-arm, so skip the __getattr__ fallback
+        self.deinit = timer.deinit
+
+    def init(self, period=None, mode=None, callback=None):
+        if mode is None:
+            mode = self.timer.PERIODIC
+        # == rather than is: each self.method lookup is a new bound method
+        if callback != self.wrapped:
+            self.wrapped = callback
+            self.accounted = self.stats.wrap(self.source, callback)
+        self.timer.init(period=period, mode=mode, callback=self.accounted)
+
+    def __getattr__(self, name):
+        return getattr(self.timer, name)
@@ -0,0 +1,501 @@
+from led_renderer import LEDRenderer
+from neopixel_colors import to_grb
+from wake_stats import WakeStats
+
+# Hardware Configuration
+LED_PIN = 16    # The LED is connected to GPIO pin 16 on RP2040-Zero
+BUTTON_PIN = 27 # Input pin for trigger
+CONTROL_PIN = 5 # Control output pin
+PIN0 = 0         # Simple LED on pin 0
+
+# Color Components (0-255, GRB order)
+COLOR_OFF = 0
+COLOR_LOW = 64  # 25% brightness
+
+# Timing Configuration (in milliseconds)
+BLINK_PERIOD_MS = 500        # 0.5 seconds per blink
+CONFIG_BLINK_PERIOD_MS = 200  # 0.2 seconds per blink in config mode (rapid)
+BUTTON_LONG_PRESS_MS = 2000  # 2 seconds for long press
+PIN5_ON_TIME_MS = 250      # 250ms for pin5 on time
+RED_SHOW_TIME_MS = 1000     # 1 second red warning
+FLASH_ERROR_TIME_MS = 250   # Time for error flash
+COMPLETE_BLUE_TIME_MS = 1000 # 1 seconds blue on completion
+DEBOUNCE_MS = 100           # Button debounce time
+IDLE_TIMEOUT_MS = 5000     # 5 seconds timeout for LED in IDLE state
+IDLE_FADE_MS = 1000        # 1 second fade out when going to sleep
+SETTINGS_FILE = "settings.txt"  # File to store configuration
+START_LOCKOUT_MS = 1000      # 1 second lockout when starting
+
+CLICK_WINDOW_MS = 400       # Max gap between release and next press in a multi-click
+
+# Default configuration
+DEFAULT_BLINK_TIME = 50000  # Default value if no saved state (50 seconds)
+# Preset durations for single, double and triple click (small, medium, large)
+DEFAULT_PRESETS = [DEFAULT_BLINK_TIME, 2 * DEFAULT_BLINK_TIME, 3 * DEFAULT_BLINK_TIME]
+PRESET_COUNT = len(DEFAULT_PRESETS)
+
+def save_to_file(durations):
+    """Save a duration, or a list of preset durations, to file"""
+    try:
+        if isinstance(durations, int):
+            text = str(durations)
+        else:
+            text = ','.join(str(d) for d in durations)
+        with open(SETTINGS_FILE, 'w') as f:
+            f.write(text)
+        return True
+    except:
+        return False
+
+def read_presets():
+    """Read preset durations from file, using defaults for missing slots.
+    
+    The file holds comma separated durations; an older file with a single
+    duration only sets the single-click preset.
+    """
+    presets = list(DEFAULT_PRESETS)
+    try:
+        with open(SETTINGS_FILE, 'r') as f:
+            values = f.read().strip().split(',')
+        for slot in range(min(PRESET_COUNT, len(values))):
+            presets[slot] = int(values[slot])
+    except:
+        pass
+    return presets
+
+def read_from_file():
+    """Read single-click duration from file, return default if file doesn't exist"""
+    return read_presets()[0]
+
+class LEDController:
+    # Colors - GRB order (Green, Red, Blue)
+    OFF = (COLOR_OFF, COLOR_OFF, COLOR_OFF)
+    RED_LOW = (COLOR_OFF, COLOR_LOW, COLOR_OFF)
+    GREEN_LOW = (COLOR_LOW, COLOR_OFF, COLOR_OFF)
+    BLUE_LOW = (COLOR_OFF, COLOR_OFF, COLOR_LOW)
+    ORANGE_LOW = (10, 128, COLOR_OFF)  # Mix of green and red for orange
+    
+    def __init__(self, hal, pin_num, stats=None):
+        self.led = hal.neopixel(hal.pin(pin_num), 1)
+        self.current_color = self.GREEN_LOW
+        self.is_on = True
+        # Initialize PIN0 as output and turn it off initially
+        self.pin0 = hal.pin(PIN0, hal.OUT)
+        self.pin0.value(0)
+        # Renderer for smooth fades and breathing
+        render_timer = hal.timer()
+        if stats is not None:
+            render_timer = stats.timer(render_timer, 'render')
+        self.renderer = LEDRenderer(self.led, render_timer, clock=hal)
+        
+    def set_color(self, color):
+        self.renderer.stop()
+        self.renderer.invalidate()
+        self.current_color = color
+        self.led[0] = to_grb(color)
+        self.led.write()
+        self.is_on = True
+        # Turn on PIN0 whenever the color LED is on
+        self.pin0.value(1)
+        
+    def turn_off(self):
+        self.renderer.stop()
+        self.renderer.invalidate()
+        self.led[0] = self.OFF
+        self.led.write()
+        self.is_on = False
+        # Turn off PIN0 whenever the color LED is off
+        self.pin0.value(0)
+        
+    def toggle(self):
+        if self.is_on:
+            self.turn_off()
+        else:
+            self.set_color(self.current_color)
+
+    def fade_to(self, color, duration_ms, on_done=None):
+        """Fade smoothly from the current color to color"""
+        start = self.current_color if self.is_on else self.OFF
+        self.current_color = color
+        self.is_on = True
+        self.pin0.value(1)
+        self.renderer.fade(start, color, duration_ms, on_done)
+
+    def fade_out(self, duration_ms, on_done=None):
+        """Fade smoothly to off, then turn the LED off"""
+        def faded():
+            self.turn_off()
+            if on_done:
+                on_done()
+        start = self.current_color if self.is_on else self.OFF
+        self.renderer.fade(start, self.OFF, duration_ms, faded)
+
+    def breathe(self, color, period_ms):
+        """Breathe color in and out until another color is set"""
+        self.current_color = color
+        self.is_on = True
+        self.pin0.value(1)
+        self.renderer.breathe(color, period_ms)
+
+class WaterFilter:
+    # States
+    IDLE = 'IDLE'
+    BLINKING = 'BLINKING'
+    TRAINING = 'TRAINING'
+    SLEEPING = 'SLEEPING'
+    
+    def __init__(self, hal=None):
+        # Hardware backend (real pins and timers unless told otherwise)
+        if hal is None:
+            from hal import HardwareBackend
+            hal = HardwareBackend()
+        self.hal = hal
+        
+        # Wakeup and busy time accounting per state and timer
+        self.stats = WakeStats((self.IDLE, self.BLINKING, self.TRAINING, self.SLEEPING), clock=hal)
+        
+        # Load preset durations from file (kept in RAM from here on)
+        self.presets = read_presets()
+        print(f"Loaded configuration: {self.presets}ms")  # Debug
+        
+        # Initialize LED
+        self.led = LEDController(hal, LED_PIN, self.stats)
+        
+        # Initialize pin5 (normally HIGH)
+        self.pin5 = hal.pin(CONTROL_PIN, hal.OUT)
+        self.pin5.value(1)  # Set to HIGH initially
+        
+        # Initialize button (no interrupt)
+        self.button = hal.pin(BUTTON_PIN, hal.IN, hal.PULL_DOWN)
+        print("Initializing button on pin", BUTTON_PIN)  # Debug
+        
+        # Initialize timers
+        self.blink_timer = self.stats.timer(hal.timer(), 'blink')
+        self.start_timer = self.stats.timer(hal.timer(), 'completion')
+        self.long_press_timer = self.stats.timer(hal.timer(), 'long_press')
+        self.button_poll_timer = self.stats.timer(hal.timer(), 'poll')  # New timer for polling button
+        self.idle_timer = self.stats.timer(hal.timer(), 'idle')  # New timer for idle timeout
+        
+        # State management
+        self.state = self.IDLE
+        self.last_button_state = False  # Track previous button state
+        self.button_press_start = 0  # For long press detection
+        self.canceling = False  # Flag to prevent new sequence during cancellation
+        
+        # Multi-click gesture tracking
+        self.click_count = 0  # Clicks in the current gesture (selects the preset)
+        self.last_release_time = 0  # Release that opened the click window
+        self.sequence_start = 0  # When the running dispense's timer was armed
+        self.training_slot = 0  # Preset slot being trained
+        
+        # Optional command channel (e.g. SerialControl), serviced from the button poll
+        self.control = None
+        
+        # Start in idle state with green light
+        self.led.set_color(self.led.GREEN_LOW)
+        print("Initialization complete, in IDLE state")  # Debug
+        
+        # Start button polling
+        self._start_button_polling()
+        
+        # Start idle timer
+        self._start_idle_timer()
+    
+    @property
+    def state(self):
+        return self._state
+    
+    @state.setter
+    def state(self, state):
+        self._state = state
+        self.stats.enter_state(state)
+    
+    @property
+    def total_blink_time_ms(self):
+        """Single-click dispense duration"""
+        return self.presets[0]
+    
+    @total_blink_time_ms.setter
+    def total_blink_time_ms(self, duration_ms):
+        self.presets[0] = duration_ms
+    
+    def _start_button_polling(self):
+        """Start polling the button every 100ms"""
+        def poll_button(timer):
+            current_state = self.button.value() == 1
+            if current_state != self.last_button_state:
+                # Edges are rare and can block, so time them exactly
+                self.stats.begin_work('poll')
+                current_time = self.hal.ticks_ms()
+                if current_state:  # Button pressed
+                    print("Button pressed detected")  # Debug
+                    self._handle_button_press(current_time)
+                else:  # Button released
+                    print("Button release detected")  # Debug
+                    self._handle_button_release(current_time)
+                self.last_button_state = current_state
+                self.stats.end_work()
+            # A command is one more action like a button edge: it only runs
+            # in a poll with no edge, so the button is always handled first
+            elif self.control is not None:
+                self.control.service()
+        
+        print("Starting button polling")  # Debug
+        self.button_poll_timer.init(period=100, mode=self.hal.PERIODIC, callback=poll_button)
+    
+    def _handle_button_press(self, current_time):
+        """Handle button press - change states and provide immediate feedback"""
+        print(f"Handling button press, state: {self.state}")  # Debug
+        self.button_press_start = current_time
+        
+        if self.state == self.IDLE and not self.canceling:  # Only handle if not canceling
+            # Show blue LED immediately
+            self.led.set_color(self.led.BLUE_LOW)
+            
+            # Start timer to check for long press
+            self._start_long_press_check(0)
+            
+        elif self.state == self.SLEEPING and not self.canceling:
+            print("Button pressed while in sleeping mode")  # Debug
+            # Nothing to do on press, wait for release
+            
+        elif self.state == self.TRAINING:
+            print("Button pressed while in training mode")  # Debug
+            # Nothing to do on press, wait for release
+            pass
+            
+        elif (self.state == self.BLINKING and self.click_count < PRESET_COUNT and
+              self.hal.ticks_diff(current_time, self.last_release_time) <= CLICK_WINDOW_MS):
+            # Another click of the same gesture: the single-click sequence is
+            # already running, so promote it instead of waiting to decode
+            self.click_count += 1
+            print(f"Click {self.click_count} detected, promoting sequence")  # Debug
+            self.led.set_color(self.led.BLUE_LOW)
+            self._promote_sequence(current_time)
+            
+            # Holding this click trains the preset it selects
+            self._start_long_press_check(self.click_count - 1)
+            
+        elif self.state == self.BLINKING:
+            print("Button pressed while blinking, canceling sequence and timers")  # Debug
+            self.canceling = True  # Set canceling flag
+            # Cancel both blink and completion timers
+            self.blink_timer.deinit()
+            self.start_timer.deinit()  # Cancel the completion timer
+            self._execute_stop_to_idle_action()  # This will handle the rest of cleanup and return to IDLE
+    
+    def _handle_button_release(self, current_time):
+        """Handle button release - start sequence if it was a short press"""
+        print(f"Handling button release, state: {self.state}")  # Debug
+        press_duration = self.hal.ticks_diff(current_time, self.button_press_start)
+        print(f"Press duration: {press_duration}ms")  # Debug
+        self.long_press_timer.deinit()
+        
+        if self.state == self.IDLE and press_duration < BUTTON_LONG_PRESS_MS and not self.canceling:
+            print("Short press detected, starting sequence")  # Debug
+            self._start_gesture(current_time)
+
+        elif self.state == self.SLEEPING and press_duration < BUTTON_LONG_PRESS_MS and not self.canceling:
+            print("Short press detected, starting sequence")  # Debug
+            self._start_gesture(current_time)
+        
+        elif self.state == self.BLINKING and not self.canceling:
+            # End of a promotion click; the next click must follow this release
+            self.last_release_time = current_time
+        
+        elif self.state == self.TRAINING:
+            print(f"Training mode release, duration: {press_duration}ms")  # Debug
+            # Calculate total training time from the original press, or for a
+            # promoted preset from the dispense start that playback measures from
+            if self.training_slot:
+                config_time = self.hal.ticks_diff(current_time, self.sequence_start)
+                # The dispense has been running since the first click: stop
+                # it now, not after the save feedback
+                self._activate_pin5()
+            else:
+                config_time = self.hal.ticks_diff(current_time, self.button_press_start)
+            print(f"Saving config time: {config_time}ms")  # Debug
+            
+            # Try to save configuration
+            presets = list(self.presets)
+            presets[self.training_slot] = config_time
+            if save_to_file(presets):
+                print(f"Save successful, preset {self.training_slot + 1}")  # Debug
+                self.presets = presets
+                
+                # Flash orange 3 times to indicate successful save
+                for _ in range(3):
+                    self.led.set_color(self.led.ORANGE_LOW)
+                    self.hal.sleep_ms(500)
+                    self.led.turn_off()
+                    self.hal.sleep_ms(500)
+            else:
+                print("Save failed")  # Debug
+                # If save fails, flash red 3 times rapidly
+                for _ in range(3):
+                    self.led.set_color(self.led.RED_LOW)
+                    self.hal.sleep_ms(FLASH_ERROR_TIME_MS)
+                    self.led.turn_off()
+                    self.hal.sleep_ms(FLASH_ERROR_TIME_MS)
+            
+            # Execute action after save feedback (already stopped for slot > 0)
+            self._execute_stop_to_idle_action(pulse=not self.training_slot)
+        
+        # Reset canceling flag after release
+        if self.canceling:
+            print("Resetting canceling flag")  # Debug
+            self.canceling = False
+    
+    def start_preset(self, slot):
+        """Start a sequence for the given preset slot without a button press"""
+        self._start_gesture(self.hal.ticks_ms())
+        if slot:
+            self.click_count = slot + 1
+            # After the start pulse, so it is not counted twice
+            self._promote_sequence(self.hal.ticks_ms())
+        # Not part of a click gesture: a button press now cancels
+        self.click_count = PRESET_COUNT
+    
+    def stop_sequence(self):
+        """Stop a running sequence and return to IDLE"""
+        self._execute_stop_to_idle_action()
+    
+    def _start_long_press_check(self, slot):
+        """Start timer that enters training mode for slot if the press is held"""
+        def check_long_press(timer):
+            if self.button.value():  # Still pressed
+                press_duration = self.hal.ticks_diff(self.hal.ticks_ms(), self.button_press_start)
+                print(f"Long press check: {press_duration}ms")  # Debug
+                if press_duration >= BUTTON_LONG_PRESS_MS:
+                    print(f"Long press detected, entering training mode for preset {slot + 1}")  # Debug
+                    self.long_press_timer.deinit()
+                    self.start_timer.deinit()  # Stop a dispense promoted by this click
+                    self.training_slot = slot
+                    self.state = self.TRAINING
+                    self._start_training_blink()
+        
+        self.long_press_timer.init(period=100, callback=check_long_press)
+    
+    def _start_gesture(self, current_time):
+        """Start the single-click sequence right away and open the click window"""
+        self.click_count = 1
+        self.last_release_time = current_time
+        self._start_sequence()
+    
+    def _promote_sequence(self, current_time):
+        """Retarget the running sequence to the preset for the current click count"""
+        duration = self.presets[self.click_count - 1]
+        remaining = duration - self.hal.ticks_diff(current_time, self.sequence_start)
+        print(f"Promoting to preset {self.click_count}: {duration}ms, {remaining}ms remaining")  # Debug
+        self.start_timer.deinit()
+        self.start_timer.init(period=max(1, remaining),
+                            mode=self.hal.ONE_SHOT,
+                            callback=lambda t: self._execute_stop_to_idle_action())
+    
+    def _activate_pin5(self):
+        """Activate pin5 by switching it LOW for 250ms then back to HIGH"""
+        print("Switching pin5 LOW for 250ms")  # Debug
+        self.pin5.value(0)  # Switch to LOW
+        self.hal.sleep_ms(PIN5_ON_TIME_MS)  # Wait exactly 250ms
+        self.pin5.value(1)  # Return to HIGH
+        print("Pin5 returned to HIGH")  # Debug
+
+    def _execute_stop_to_idle_action(self, pulse=True):
+        """Execute the completion action: switch pin5 LOW and show red LED"""
+        print(f"Executing completion action, canceling current state: {self.state}")  # Debug
+        
+        # Cancel any current operation by stopping all timers
+        print("Stopping all timers")  # Debug
+        self.blink_timer.deinit()
+        self.start_timer.deinit()
+        self.long_press_timer.deinit()
+        
+        # Activate pin5
+        if pulse:
+            self._activate_pin5()
+        
+        # Show red LED for 1 second then return to standby
+        print("Showing red LED for 1 second")  # Debug
+        self.led.set_color(self.led.RED_LOW)
+        self.hal.sleep_ms(RED_SHOW_TIME_MS)
+        
+        # Return to standby (green LED)
+        print("Returning to standby (green LED)")  # Debug
+        self.state = self.IDLE  # Always return to IDLE state
+        self.led.set_color(self.led.GREEN_LOW)
+        
+        # Restart the idle timer
+        self._start_idle_timer()
+    
+    def _start_sequence(self):
+        """Start the normal blinking sequence"""
+        print(f"Starting normal sequence, will run for {self.total_blink_time_ms}ms ({self.total_blink_time_ms/1000:.1f} seconds)")  # Debug
+        
+        # Cancel any existing timers first
+        print("Canceling any existing timers")  # Debug
+        self.blink_timer.deinit()
+        self.start_timer.deinit()
+        self.long_press_timer.deinit()
+        self.idle_timer.deinit()  # Cancel idle timer when starting sequence
+        self.led.renderer.stop()  # A sleep fade must not run into the blinking
+        
+        self.state = self.BLINKING
+        
+        # Start blinking green
+        def blink(timer):
+            self.led.toggle()
+            if not self.led.is_on:
+                self.led.current_color = self.led.GREEN_LOW
+
+         # Activate pin5
+        self._activate_pin5()
+        
+        print("Starting green blink")  # Debug
+        self.blink_timer.init(period=BLINK_PERIOD_MS, 
+                            mode=self.hal.PERIODIC,
+                            callback=blink)
+        
+        # Set timer for completion; promotions and training time from here too
+        print("Setting completion timer")  # Debug
+        self.sequence_start = self.hal.ticks_ms()
+        self.start_timer.init(period=self.total_blink_time_ms,
+                            mode=self.hal.ONE_SHOT,
+                            callback=lambda t: self._execute_stop_to_idle_action())
+    
+    def _start_training_blink(self):
+        """Start rapid blinking for training mode"""
+        print("Starting training blink")  # Debug
+        def rapid_blink(timer):
+            if self.state == self.TRAINING:  # Only blink if still in training
+                self.led.toggle()
+                if not self.led.is_on:
+                    self.led.current_color = self.led.BLUE_LOW
+        
+        # Stop any existing blink timer
+        self.blink_timer.deinit()
+        self.idle_timer.deinit()  # Cancel idle timer when entering training mode
+        
+        # Set initial color and start rapid blinking
+        self.led.set_color(self.led.BLUE_LOW)
+        self.blink_timer.init(period=CONFIG_BLINK_PERIOD_MS, callback=rapid_blink)
+    
+    def _start_idle_timer(self):
+        """Start timer to turn off LED after idle timeout"""
+        print("Starting idle timer")  # Debug
+        
+        # Cancel any existing idle timer first
+        self.idle_timer.deinit()
+        
+        def idle_timeout(timer):
+            # Only turn off LED if in IDLE state
+            if self.state == self.IDLE:
+                print("Idle timeout reached, fading out LED")  # Debug
+                self.led.fade_out(IDLE_FADE_MS)
+                self.state = self.SLEEPING
+            else:
+                print(f"Idle timeout ignored, current state: {self.state}")  # Debug
+        
+        # Set timer for idle timeout
+        self.idle_timer.init(period=IDLE_TIMEOUT_MS,
+                           mode=self.hal.ONE_SHOT,
+                           callback=idle_timeout)